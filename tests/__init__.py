@@ -0,0 +1,8 @@
+"""
+Test package for the Account Service
+"""
+import os
+
+# The service connects to DATABASE_URI as soon as it is imported, so the
+# default for the tests has to be in place before any test imports it
+os.environ.setdefault("DATABASE_URI", "sqlite:///:memory:")
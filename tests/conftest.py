@@ -0,0 +1,133 @@
+"""
+Pytest configuration for the test suite
+
+The suite is normally run serially with nosetests (see the Makefile and
+CI). Running it in parallel with pytest-xdist is opt-in:
+  pytest -n auto
+
+At the current suite size the workers' start-up costs more than they
+save, so only reach for -n once the suite is much larger.
+
+Each xdist worker is pointed at its own database so that workers never
+see each other's rows. With PostgreSQL the schema is created once in a
+template database and every worker database is cloned from it.
+"""
+import os
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine.url import make_url
+
+DATABASE_URI = os.getenv("DATABASE_URI")
+
+TEMPLATE_DATABASE = "template_test"
+
+
+######################################################################
+#  W O R K E R   D A T A B A S E S
+######################################################################
+def worker_database_url(url, worker):
+    """Returns a copy of the database URL that is private to a worker"""
+    if url.get_backend_name() == "postgresql":
+        return url.set(database=f"test_{worker}")
+    in_memory = url.database in (None, "", ":memory:")
+    if url.get_backend_name() == "sqlite" and not in_memory:
+        root, ext = os.path.splitext(url.database)
+        return url.set(database=f"{root}_{worker}{ext}")
+    return url
+
+
+def run_admin_sql(admin_url, *statements):
+    """Runs statements that cannot be executed inside a transaction"""
+    engine = create_engine(admin_url, isolation_level="AUTOCOMMIT")
+    try:
+        with engine.connect() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+    finally:
+        engine.dispose()
+
+
+def build_template_database(url):
+    """Creates the template database and the service schema inside it"""
+    run_admin_sql(
+        url,
+        f'DROP DATABASE IF EXISTS "{TEMPLATE_DATABASE}"',
+        f'CREATE DATABASE "{TEMPLATE_DATABASE}"',
+    )
+    template_url = url.set(database=TEMPLATE_DATABASE)
+    default_uri = os.environ.get("DATABASE_URI")
+    os.environ["DATABASE_URI"] = template_url.render_as_string(
+        hide_password=False
+    )
+    try:
+        # Importing the service runs init_db() against DATABASE_URI
+        # pylint: disable=import-outside-toplevel
+        from service.models import db
+        # The template can't be cloned while it has open connections
+        db.engine.dispose()
+    finally:
+        if default_uri is None:
+            del os.environ["DATABASE_URI"]
+        else:
+            os.environ["DATABASE_URI"] = default_uri
+
+
+def is_xdist_worker(config):
+    """Returns True when running inside an xdist worker process"""
+    return hasattr(config, "workerinput")
+
+
+def is_xdist_controller(config):
+    """Returns True when running the process that starts the xdist workers"""
+    return not is_xdist_worker(config) and bool(
+        getattr(config.option, "numprocesses", None)
+    )
+
+
+def pytest_configure(config):
+    """Prepares the template database and points each worker at its own"""
+    # This has to happen before the test modules are collected because
+    # importing the service binds it to DATABASE_URI straight away
+    url = make_url(DATABASE_URI)
+    if is_xdist_controller(config):
+        if url.get_backend_name() == "postgresql":
+            build_template_database(url)
+        return
+    if not is_xdist_worker(config):
+        return
+    worker_url = worker_database_url(url, os.environ["PYTEST_XDIST_WORKER"])
+    if url.get_backend_name() == "postgresql":
+        run_admin_sql(
+            url,
+            f'DROP DATABASE IF EXISTS "{worker_url.database}"',
+            f'CREATE DATABASE "{worker_url.database}" '
+            f'TEMPLATE "{TEMPLATE_DATABASE}"',
+        )
+    os.environ["DATABASE_URI"] = worker_url.render_as_string(
+        hide_password=False
+    )
+
+
+def pytest_unconfigure(config):
+    """Drops the template database once all workers have finished"""
+    url = make_url(DATABASE_URI)
+    if is_xdist_controller(config) and url.get_backend_name() == "postgresql":
+        run_admin_sql(url, f'DROP DATABASE IF EXISTS "{TEMPLATE_DATABASE}"')
+
+
+@pytest.fixture(scope="session", autouse=True)
+def worker_database(request):
+    """Drops the worker's private database at the end of the session"""
+    yield
+    url = make_url(DATABASE_URI)
+    if not is_xdist_worker(request.config):
+        return
+    if url.get_backend_name() != "postgresql":
+        return
+    # pylint: disable=import-outside-toplevel
+    from service.models import db
+    db.engine.dispose()
+    worker_url = make_url(os.environ["DATABASE_URI"])
+    run_admin_sql(
+        url, f'DROP DATABASE IF EXISTS "{worker_url.database}" WITH (FORCE)'
+    )